@@ -1,16 +1,27 @@
 import configparser
+import re     # For sanitizing titles into file names
+import string # For the ASCII title character set
 import requests
+from requests.adapters import HTTPAdapter # For connection pooling and retries
+import urllib3 # Used directly for image downloads (no session/adapter layers needed)
+from urllib3.util.retry import Retry       # Retry policy (honors Retry-After on 429s)
 import sys
 import os
 import random
-from screeninfo import get_monitors
-import ctypes # For Windows API calls (SystemParametersInfoW)
-import winreg # For modifying Windows registry (wallpaper style)
+# screeninfo, ctypes and winreg are imported lazily in the functions that use them to keep startup fast
 import math   # For aspect ratio calculations
 from urllib.parse import urlparse # To parse URLs and get file extensions
-import time   # Added for delays (time.sleep)
-import glob   # For finding files during cleanup
 import json   # Added for handling wallpaper history
+try:
+    import orjson # Optional: faster JSON parsing for Reddit listings and history
+except ImportError:
+    orjson = None
+import hashlib # For content hashes of downloaded wallpapers
+import io     # For rendering the config before writing it atomically
+from concurrent.futures import ThreadPoolExecutor # For downloading candidates concurrently
+import threading # For running cleanup in the background
+import logging # Thread-safe status output (downloads and fetches run on worker threads)
+import time   # For checking the age of the Reddit listing cache
 
 # --- Global Constants & Paths (will be updated during setup if needed) ---
 # Default names for files/folders, their exact path depends on user's choice during setup
@@ -25,175 +36,347 @@ GLOBAL_CONFIG_PATH = os.path.join(GLOBAL_SCRIPT_DIR, DEFAULT_CONFIG_FILENAME)
 GLOBAL_HISTORY_PATH = os.path.join(GLOBAL_SCRIPT_DIR, DEFAULT_HISTORY_FILENAME)
 GLOBAL_DOWNLOAD_PATH = os.path.join(GLOBAL_SCRIPT_DIR, DEFAULT_WALLPAPER_DIR_NAME) # This can be overridden by config
 
+# Status output goes through logging so lines from worker threads don't interleave;
+# the interactive setup guide keeps using print/input
+log = logging.getLogger('wallpaper')
+
+# Dedicated generator for wallpaper selection, independent of any seeding of the global random module
+_RNG = random.Random()
+
+MAX_DOWNLOAD_WORKERS = 8 # Upper bound on concurrent wallpaper downloads
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024 # 1 MiB copy buffer for image downloads
+MAX_DOWNLOAD_BYTES = 50 * 1024 * 1024 # Skip images larger than this (per Content-Length)
+DOWNLOAD_TIMEOUT = urllib3.Timeout(connect=5, read=30) # So slow hosts don't stall download threads
+
 # Windows API constants for setting wallpaper
+SPI_GETDESKWALLPAPER = 0x0073
 SPI_SETDESKWALLPAPER = 20
+MAX_PATH = 260
 SPIF_UPDATEINIFILE = 0x01
 SPIF_SENDCHANGE = 0x02
 
+# Wallpaper style -> (WallpaperStyle, TileWallpaper) registry values
+WALLPAPER_STYLE_MAP = {
+    'fill': ("10", "0"),
+    'fit': ("6", "0"),
+    'stretch': ("2", "0"),
+    'center': ("0", "0"),
+    'tile': ("0", "1"),
+}
+
+# Retries (with backoff and Retry-After support) are handled by urllib3 instead of by hand,
+# so requests only wait when the server actually rate-limits (429) or fails (5xx).
+# raise_on_status=False hands back the final response once retries run out, so callers
+# see the real status code (e.g. 429).
+HTTP_RETRY = Retry(
+    total=3,
+    backoff_factor=1,
+    status_forcelist=[429, 500, 502, 503, 504],
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+# Shared HTTP session for Reddit API requests so they reuse keep-alive connections
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=HTTP_RETRY))
+
+# Plain urllib3 pool for image downloads from i.redd.it/imgur; downloads need no cookies,
+# auth or hooks, so this skips the per-request overhead of the requests layers
+HTTP = urllib3.PoolManager(num_pools=4, maxsize=16, timeout=DOWNLOAD_TIMEOUT, retries=HTTP_RETRY)
+
+# --- JSON helpers (use orjson when installed, stdlib json otherwise) ---
+def json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(obj):
+    # Returns compact UTF-8 encoded bytes in both cases (no indentation to format or parse)
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+# Write to a temporary file next to the target and rename it into place, so an
+# interrupted write never leaves a truncated config/history file behind. No fsync:
+# a lost update is harmless here, a stalled exit is not.
+def write_file_atomically(path, data, mode='wb'):
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, mode) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        # Don't leave a stale temp file behind if the write or rename failed
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
 # --- 1. Load Configuration ---
 def load_config():
-    config = configparser.ConfigParser()
     if not os.path.exists(GLOBAL_CONFIG_PATH):
         # This shouldn't happen if setup_initial_config is called first
-        print(f"Error: {GLOBAL_CONFIG_PATH} not found. Please run setup first.")
+        log.error(f"Error: {GLOBAL_CONFIG_PATH} not found. Please run setup first.")
         sys.exit(1)
+    config = configparser.ConfigParser()
     config.read(GLOBAL_CONFIG_PATH)
     return config['SETTINGS'], config['REDDIT_API']
 
-# --- 2. Check for Internet Connection ---
-def check_internet_connection(timeout=10):
-    try:
-        response = requests.get("https://www.google.com", timeout=timeout)
-        response.raise_for_status()
-        print("Internet connection active.")
-        return True
-    except requests.exceptions.RequestException as e:
-        print(f"Error: Could not establish network connection. Details: {e}")
-        return False
-    except Exception as e:
-        print(f"An unexpected error occurred while checking internet: {e}")
-        return False
-
-# --- 3. Detect and Determine Target Resolution ---
+# --- 2. Detect and Determine Target Resolution ---
 def get_resolutions_and_preference(settings):
     detected_width, detected_height = 0, 0
     try:
+        from screeninfo import get_monitors
         monitors = get_monitors()
         if monitors:
             main_monitor = monitors[0]
             detected_width = main_monitor.width
             detected_height = main_monitor.height
-            print(f"Detected current screen resolution: {detected_width}x{detected_height}")
+            log.info(f"Detected current screen resolution: {detected_width}x{detected_height}")
         else:
-            print("Warning: Could not detect screen resolution.")
+            log.warning("Warning: Could not detect screen resolution.")
     except Exception as e:
-        print(f"Error detecting screen resolution: {e}.")
+        log.error(f"Error detecting screen resolution: {e}.")
 
     target_resolution_str = settings.get('RESOLUTION').strip()
     if target_resolution_str:
         try:
             target_width, target_height = map(int, target_resolution_str.split('x'))
-            print(f"Using preferred target resolution from config: {target_width}x{target_height}")
+            log.info(f"Using preferred target resolution from config: {target_width}x{target_height}")
         except ValueError:
-            print(f"Warning: Invalid RESOLUTION format in config '{target_resolution_str}'. Using detected resolution as fallback.")
+            log.warning(f"Warning: Invalid RESOLUTION format in config '{target_resolution_str}'. Using detected resolution as fallback.")
             target_width, target_height = detected_width, detected_height
     else:
         target_width, target_height = detected_width, detected_height
         if target_width == 0: # Fallback if detection also failed
             target_width, target_height = 1920, 1080
-            print(f"No preferred resolution set in config and detection failed. Using default 1920x1080.")
+            log.info(f"No preferred resolution set in config and detection failed. Using default 1920x1080.")
         else:
-            print(f"No preferred resolution set in config. Using detected resolution ({target_width}x{target_height}) as target.")
+            log.info(f"No preferred resolution set in config. Using detected resolution ({target_width}x{target_height}) as target.")
 
     allow_aspect_ratio_variation = settings.getboolean('ALLOW_ASPECT_RATIO_VARIATION', True)
-    print(f"Allow aspect ratio variation: {allow_aspect_ratio_variation}")
+    log.info(f"Allow aspect ratio variation: {allow_aspect_ratio_variation}")
 
     return (detected_width, detected_height), (target_width, target_height), allow_aspect_ratio_variation
 
 # --- Reddit Fetching and Filtering Functions ---
 
-def get_reddit_posts(settings, reddit_api_settings):
-    subreddit = settings.get('SUBREDDIT')
-    sort_order = settings.get('SORT_ORDER')
-    fetch_limit = settings.getint('FETCH_LIMIT')
-    user_agent = reddit_api_settings.get('USER_AGENT')
+REDDIT_PAGE_LIMIT = 100 # Reddit caps a single listing request at 100 posts
 
-    url = f"https://www.reddit.com/r/{subreddit}/{sort_order}/.json?limit={fetch_limit}&t=all"
+REDDIT_CACHE_FILENAME = 'reddit_cache.json' # Stored next to config.ini
+REDDIT_CACHE_TTL = 15 * 60 # Seconds a cached Reddit listing stays valid
+SUBREDDITS_PER_REQUEST = 10 # Subreddits combined into one 'r/a+b+c' listing request (keeps URLs short)
+MAX_FETCH_WORKERS = 4 # Concurrent subreddit fetches, kept small to respect Reddit's rate limits
 
-    print(f"Fetching posts from Reddit: {url}")
-    headers = {"User-Agent": user_agent}
+def get_subreddit_posts(subreddit, sort_order, fetch_limit):
+    base_url = f"https://www.reddit.com/r/{subreddit}/{sort_order}/.json"
 
+    # Listings are paginated with an 'after' cursor, so pages beyond the first
+    # have to be requested one after another. Posts are deduplicated by fullname.
+    # Returns (posts, complete), where complete is False if an error cut the fetch short.
+    posts = []
+    seen_names = set()
+    after = None
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        posts = data['data']['children']
-        print(f"Successfully fetched {len(posts)} posts.")
-        return posts
+        while len(posts) < fetch_limit:
+            page_limit = min(REDDIT_PAGE_LIMIT, fetch_limit - len(posts))
+            url = f"{base_url}?limit={page_limit}&t=all"
+            if after:
+                url += f"&after={after}"
+
+            log.info(f"Fetching posts from Reddit: {url}")
+            response = SESSION.get(url, timeout=10)
+            response.raise_for_status()
+            listing = json_loads(response.content)['data']
+
+            for post in listing['children']:
+                name = post['data']['name']
+                if name not in seen_names:
+                    seen_names.add(name)
+                    posts.append(post)
+
+            after = listing.get('after')
+            if not after or not listing['children']:
+                break
+    except requests.exceptions.ConnectionError as e:
+        if not posts:
+            raise # Nothing could be fetched at all; the caller treats this as no internet connection
+        log.error(f"Error fetching posts from r/{subreddit}: {e}")
+        return posts, False # Keep whatever pages were fetched before the error
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching Reddit posts: {e}")
-        return []
+        log.error(f"Error fetching posts from r/{subreddit}: {e}")
+        return posts, False
+    except ValueError as e: # Invalid JSON (json and orjson decode errors are both ValueErrors)
+        log.error(f"Error decoding Reddit response for r/{subreddit}: {e}")
+        return posts, False
+
+    log.info(f"Fetched {len(posts)} posts from r/{subreddit}.")
+    return posts, True
 
-def calculate_aspect_ratio(width, height):
-    if height == 0:
-        return 0
-    return width / height
+def load_cached_posts(cache_path, cache_key):
+    # Returns the cached posts if the cache file is fresh and was written for the same settings, else None
+    try:
+        if time.time() - os.stat(cache_path).st_mtime > REDDIT_CACHE_TTL:
+            return None
+        with open(cache_path, 'rb') as f:
+            cache = json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get('key') != cache_key:
+        return None
+    return cache.get('posts')
+
+def get_reddit_posts(settings):
+    # SUBREDDIT may list several subreddits separated by commas. Reddit serves a combined listing
+    # for 'r/sub1+sub2+...', so they're requested in groups of up to SUBREDDITS_PER_REQUEST,
+    # with the groups fetched concurrently.
+    subreddits = [sub.strip() for sub in settings.get('SUBREDDIT').split(',') if sub.strip()] or ['wallpapers']
+    sort_order = settings.get('SORT_ORDER')
+    fetch_limit = settings.getint('FETCH_LIMIT')
 
-def filter_wallpapers(posts, target_res, allow_variation, settings):
+    # Re-runs within the TTL reuse the last listing instead of calling the Reddit API again.
+    # A cache hit makes no request, so it also skips the no-internet check in __main__: an
+    # offline run within the TTL only fails later, when the image downloads fail.
+    cache_path = os.path.join(os.path.dirname(GLOBAL_CONFIG_PATH), REDDIT_CACHE_FILENAME)
+    cache_key = [subreddits, sort_order, fetch_limit]
+    cached_posts = load_cached_posts(cache_path, cache_key)
+    if cached_posts:
+        log.info(f"Using {len(cached_posts)} cached Reddit posts (less than {REDDIT_CACHE_TTL // 60} minutes old).")
+        return cached_posts
+
+    subreddit_groups = [subreddits[i:i + SUBREDDITS_PER_REQUEST] for i in range(0, len(subreddits), SUBREDDITS_PER_REQUEST)]
+    with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(subreddit_groups))) as executor:
+        # FETCH_LIMIT stays a per-subreddit budget, so a combined listing gets one budget per member
+        futures = [executor.submit(get_subreddit_posts, '+'.join(group), sort_order, fetch_limit * len(group))
+                   for group in subreddit_groups]
+
+    posts = []
+    seen_names = set()
+    connection_error = None
+    all_complete = True
+    for future in futures:
+        try:
+            subreddit_posts, complete = future.result()
+        except requests.exceptions.ConnectionError as e:
+            connection_error = e
+            all_complete = False
+            continue
+        all_complete = all_complete and complete
+        for post in subreddit_posts:
+            name = post['data']['name']
+            if name not in seen_names: # Crossposts can show up in more than one subreddit
+                seen_names.add(name)
+                posts.append(post)
+
+    if not posts and connection_error:
+        raise connection_error
+
+    log.info(f"Successfully fetched {len(posts)} posts.")
+    # Only cache a listing where every group was fetched cleanly, so a degraded one isn't reused
+    if posts and all_complete:
+        try:
+            write_file_atomically(cache_path, json_dumps({'key': cache_key, 'posts': posts}))
+        except OSError as e:
+            log.warning(f"Warning: Could not write Reddit cache {cache_path}: {e}")
+    return posts
+
+# Image URL check in a single regex scan: an i.redd.it/imgur.com host, or a path ending in an image extension
+IMAGE_URL_RE = re.compile(r'^[^:/?#]+://[^/?#]*(?:i\.redd\.it|imgur\.com)|^[^?#]*\.(?:jpe?g|png|gif)(?:[?#]|$)', re.IGNORECASE)
+REDDIT_HOST_RE = re.compile(r'^[^:/?#]+://[^/?#]*i\.redd\.it', re.IGNORECASE)
+
+ASPECT_RATIO_TOLERANCE = 0.02
+MIN_DIMENSION_PERCENTAGE = 0.90
+FILTER_OVERPROVISION_FACTOR = 3 # Stop filtering once DOWNLOAD_LIMIT * this many wallpapers are found
+
+def resolution_filter(target_res, allow_variation):
+    # Returns a predicate (width, height) -> bool for the configured resolution preference.
+    # Aspect ratio bounds and minimum dimensions are computed once here, not per image.
+    # Image dimensions are ints, so ceil() keeps the original ">= target * percentage" test exact.
+    target_width, target_height = target_res
+    target_aspect_ratio = target_width / target_height if target_height else 0
+    min_aspect_ratio = target_aspect_ratio - ASPECT_RATIO_TOLERANCE
+    max_aspect_ratio = target_aspect_ratio + ASPECT_RATIO_TOLERANCE
+    min_width = math.ceil(target_width * MIN_DIMENSION_PERCENTAGE)
+    min_height = math.ceil(target_height * MIN_DIMENSION_PERCENTAGE)
+
+    if not allow_variation:
+        return lambda width, height: width == target_width and height == target_height
+    return lambda width, height: (min_aspect_ratio < width / height < max_aspect_ratio and
+                                  width >= min_width and height >= min_height)
+
+def filter_wallpapers(posts, target_res, allow_variation, settings, history_set=frozenset()):
     min_score = settings.getint('MIN_SCORE')
     filter_nsfw = settings.getboolean('FILTER_NSFW')
     download_limit = settings.getint('DOWNLOAD_LIMIT')
 
-    target_width, target_height = target_res
-    target_aspect_ratio = calculate_aspect_ratio(target_width, target_height)
-    
-    ASPECT_RATIO_TOLERANCE = 0.02 
-    MIN_DIMENSION_PERCENTAGE = 0.90 
+    is_suitable_resolution = resolution_filter(target_res, allow_variation)
 
     suitable_wallpapers = []
 
-    print("\nStarting wallpaper filtering...")
+    # Bind hot globals/methods to locals to avoid repeated global and attribute lookups per post
+    is_image_url = IMAGE_URL_RE.search
+    add_suitable = suitable_wallpapers.append
+
+    # Cheap score/NSFW predicates are applied up front in a comprehension, which also
+    # gives the shuffle and the main loop fewer posts to work through.
+    posts = [post for post in posts
+             if post['data']['score'] >= min_score and not (filter_nsfw and post['data'].get('over_18'))]
+
+    # Visit posts in random order and stop once there is a comfortable surplus of matches;
+    # the final sample below still picks among them for variety.
+    _RNG.shuffle(posts)
+    enough_suitable = download_limit * FILTER_OVERPROVISION_FACTOR
+
+    log.info("\nStarting wallpaper filtering...")
     for post in posts:
         post_data = post['data']
-        
-        if post_data['score'] < min_score:
-            continue
-        if filter_nsfw and post_data.get('over_18', False):
-            continue
 
         image_url = post_data.get('url_overridden_by_dest') or post_data.get('url')
         if not image_url:
             continue
+        if image_url in history_set: # Skip already-used wallpapers before any further checks
+            continue
 
-        parsed_url = urlparse(image_url)
-        file_name = parsed_url.path.split('/')[-1] if parsed_url.path else ''
-        
-        if not (file_name.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')) or
-                'i.redd.it' in parsed_url.netloc or 'imgur.com' in parsed_url.netloc):
+        if not is_image_url(image_url):
             continue
 
-        image_width, image_height = 0, 0
-        if 'preview' in post_data and 'images' in post_data['preview'] and len(post_data['preview']['images']) > 0:
+        try:
             source_image = post_data['preview']['images'][0]['source']
-            image_width = source_image.get('width', 0)
-            image_height = source_image.get('height', 0)
-        
-        if image_width == 0 or image_height == 0:
-            continue
+            image_width = source_image['width']
+            image_height = source_image['height']
+        except (KeyError, IndexError, TypeError):
+            continue # No usable preview dimensions
 
-        image_aspect_ratio = calculate_aspect_ratio(image_width, image_height)
+        if not image_width or not image_height:
+            continue
 
-        is_suitable_resolution = False
-        if not allow_variation:
-            if image_width == target_width and image_height == target_height:
-                is_suitable_resolution = True
-        else:
-            if abs(image_aspect_ratio - target_aspect_ratio) < ASPECT_RATIO_TOLERANCE:
-                if image_width >= (target_width * MIN_DIMENSION_PERCENTAGE) and \
-                   image_height >= (target_height * MIN_DIMENSION_PERCENTAGE):
-                    is_suitable_resolution = True
-        
-        if is_suitable_resolution:
-            print(f"  - Found suitable: {post_data['title']} ({image_width}x{image_height}, Score: {post_data['score']})")
-            wallpaper_info = {
+        if is_suitable_resolution(image_width, image_height):
+            title = post_data['title']
+            log.info(f"  - Found suitable: {title} ({image_width}x{image_height}, Score: {post_data['score']})")
+            add_suitable({
                 'url': image_url,
-                'title': post_data['title'],
-                'dimensions': (image_width, image_height)
-            }
-            if 'i.redd.it' in parsed_url.netloc:
-                wallpaper_info['is_reddit_host'] = True
-            else:
-                wallpaper_info['is_reddit_host'] = False
-            suitable_wallpapers.append(wallpaper_info)
+                'title': title,
+                'dimensions': (image_width, image_height),
+                'is_reddit_host': REDDIT_HOST_RE.match(image_url) is not None
+            })
+            if len(suitable_wallpapers) >= enough_suitable:
+                log.info(f"Found {enough_suitable} suitable wallpapers, skipping the remaining posts.")
+                break
 
     if len(suitable_wallpapers) > download_limit:
-        suitable_wallpapers = random.sample(suitable_wallpapers, download_limit)
-        print(f"Limited suitable wallpapers to {download_limit} for download.")
+        suitable_wallpapers = _RNG.sample(suitable_wallpapers, download_limit)
+        log.info(f"Limited suitable wallpapers to {download_limit} for download.")
     
-    print(f"Finished filtering. Found {len(suitable_wallpapers)} suitable wallpapers.")
+    log.info(f"Finished filtering. Found {len(suitable_wallpapers)} suitable wallpapers.")
     return suitable_wallpapers
 
+# Title characters kept in file names: alphanumerics, space, '.' and '_'.
+# ASCII titles go through a str.translate deletion table; others use an equivalent Unicode-aware regex.
+TITLE_ALLOWED_ASCII = frozenset(string.ascii_letters + string.digits + ' ._')
+TITLE_ASCII_DELETE_TABLE = str.maketrans('', '', ''.join(chr(c) for c in range(128) if chr(c) not in TITLE_ALLOWED_ASCII))
+TITLE_DISALLOWED_RE = re.compile(r'[^\w .]+')
+
 def download_wallpaper(wallpaper_info, download_dir):
+    # Returns (file_path, sha256 hex digest of the content), or None if the download failed
     image_url = wallpaper_info['url']
     image_title = wallpaper_info['title']
     
@@ -202,7 +385,10 @@ def download_wallpaper(wallpaper_info, download_dir):
     if not file_extension:
         file_extension = '.jpg'
 
-    sanitized_title = ''.join(c for c in image_title if c.isalnum() or c in (' ', '.', '_')).strip()
+    if image_title.isascii():
+        sanitized_title = image_title.translate(TITLE_ASCII_DELETE_TABLE).strip()
+    else:
+        sanitized_title = TITLE_DISALLOWED_RE.sub('', image_title).strip()
     sanitized_title = sanitized_title.replace(' ', '_')[:50]
     
     original_file_part = os.path.basename(parsed_url.path).split('.')[0][:20]
@@ -211,117 +397,237 @@ def download_wallpaper(wallpaper_info, download_dir):
     filename = filename[:200]
     file_path = os.path.join(download_dir, filename)
 
-    print(f"Attempting to download: {image_title} from {image_url}")
+    log.info(f"Attempting to download: {image_title} from {image_url}")
 
-    max_retries = 3
-    for attempt in range(max_retries):
+    try:
+        # Transient errors and 429s are retried by the pool's Retry policy
+        response = HTTP.request('GET', image_url, preload_content=False,
+                                headers={"User-Agent": SESSION.headers["User-Agent"]})
         try:
-            time.sleep(5)
-            if attempt > 0:
-                delay = 2 ** attempt
-                print(f"Attempt {attempt + 1}/{max_retries}: Waiting {delay} seconds before retrying download...")
-                time.sleep(delay)
-
-            response = requests.get(image_url, stream=True, timeout=10)
-            response.raise_for_status()
-
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            print("Download complete.")
-            return file_path
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:
-                print(f"Rate limit hit (429 error) for {image_url}. Retrying...")
-            else:
-                print(f"HTTP Error downloading {image_url}: {e}. Not retrying this particular error.")
+            if response.status == 429:
+                log.warning(f"Rate limit (429 error) persisted for {image_url} after retries. Failed to download.")
                 return None
-        except requests.exceptions.RequestException as e:
-            print(f"Network error downloading {image_url}: {e}. Retrying...")
-        except Exception as e:
-            print(f"An unexpected error occurred during download for {image_url}: {e}. Not retrying this particular error.")
-            return None
-    print(f"Max retries reached for {image_url}. Failed to download due to persistent issues.")
+            if response.status >= 400:
+                log.error(f"HTTP Error downloading {image_url}: {response.status} {response.reason}")
+                return None
+            # Fail fast on the response headers, before any of the body is read
+            content_type = response.headers.get('Content-Type', '')
+            if not content_type.lower().startswith('image/'):
+                log.info(f"Skipping {image_url}: not an image (Content-Type: {content_type or 'unknown'}).")
+                response.close() # Don't drain a body we don't want; the drain in finally is then a no-op
+                return None
+            content_length = response.headers.get('Content-Length', '')
+            if content_length.isdigit() and int(content_length) > MAX_DOWNLOAD_BYTES:
+                log.info(f"Skipping {image_url}: too large ({int(content_length) // (1024 * 1024)} MiB).")
+                response.close()
+                return None
+            # Hash while writing so content deduplication needs no second pass over the file
+            content_hash = hashlib.sha256()
+            try:
+                with open(file_path, 'wb') as f:
+                    for chunk in response.stream(DOWNLOAD_CHUNK_SIZE):
+                        content_hash.update(chunk)
+                        f.write(chunk)
+            except BaseException:
+                # Don't leave a partial file behind; cleanup only knows about files recorded in history
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                raise
+        finally:
+            response.drain_conn()
+            response.release_conn()
+        log.info("Download complete.")
+        return file_path, content_hash.hexdigest()
+    except urllib3.exceptions.HTTPError as e:
+        log.error(f"Network error downloading {image_url}: {e}")
+        return None
+    except Exception as e:
+        log.error(f"An unexpected error occurred during download for {image_url}: {e}")
+        return None
+
+def check_downloaded_image(file_path, is_suitable_resolution):
+    # Verifies the real dimensions of a downloaded image when Pillow is installed. Image.open only
+    # parses the header, so this stays cheap. Returns None if the image is acceptable, otherwise
+    # the reason for rejecting it.
+    try:
+        from PIL import Image
+    except ImportError:
+        return None # Pillow is optional; fall back to trusting the Reddit preview dimensions
+    try:
+        with Image.open(file_path) as image:
+            width, height = image.size
+    except Exception as e:
+        return f"not a readable image ({e})"
+    if not is_suitable_resolution(width, height):
+        return f"actual resolution {width}x{height} doesn't match the target"
     return None
 
+def discard_download(download_future):
+    # Done-callback for download futures whose result is not used: removes the downloaded file
+    if download_future.cancelled():
+        return
+    download = download_future.result() # download_wallpaper returns None instead of raising
+    if download:
+        file_path = download[0]
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass # Already removed by the background cleanup
+        except OSError as e:
+            log.error(f"  - Error deleting unused download {os.path.basename(file_path)}: {e}")
+
+def download_wallpaper_candidates(candidates, download_dir, is_suitable_resolution, known_hashes):
+    # Downloads candidates concurrently and returns (wallpaper_info, file_path, content_hash) for the
+    # first acceptable one in priority order; file_path is None if none could be used
+
+    # Partition candidates by host in a single pass using the is_reddit_host flag set during
+    # filtering, then shuffle each group once. Trying them in this fixed order (i.redd.it first)
+    # needs no per-retry random picks or list removals.
+    reddit_hosted_options, imgur_hosted_options = [], []
+    for wallpaper in candidates:
+        (reddit_hosted_options if wallpaper['is_reddit_host'] else imgur_hosted_options).append(wallpaper)
+    _RNG.shuffle(reddit_hosted_options)
+    _RNG.shuffle(imgur_hosted_options)
+    ordered_candidates = reddit_hosted_options + imgur_hosted_options
+
+    # --- Start all candidate downloads concurrently, in the order they will be tried ---
+    log.info(f"\nDownloading {len(ordered_candidates)} candidate wallpapers...")
+    executor = ThreadPoolExecutor(max_workers=min(MAX_DOWNLOAD_WORKERS, len(ordered_candidates)))
+    # Futures are kept alongside their wallpapers rather than stored on the wallpaper dicts
+    downloads = [(wallpaper, executor.submit(download_wallpaper, wallpaper, download_dir))
+                 for wallpaper in ordered_candidates]
+
+    downloaded_file_path = None
+    content_hash = None
+    chosen_wallpaper = None
+
+    # --- Loop to select a downloaded wallpaper until successful or options exhausted ---
+    for chosen_wallpaper, chosen_download in downloads:
+        if chosen_wallpaper['is_reddit_host']:
+            log.info(f"\nSelecting prioritized i.redd.it wallpaper: '{chosen_wallpaper['title']}'")
+        else:
+            log.info(f"\nNo i.redd.it wallpaper available, selecting Imgur wallpaper: '{chosen_wallpaper['title']}'")
+
+        # Only waits for this candidate's download; the others keep running in the background
+        download = chosen_download.result()
+
+        if not download:
+            log.warning(f"Failed to download '{chosen_wallpaper['title']}'. Trying another if available.")
+            continue
+
+        downloaded_file_path, content_hash = download
+        # Same image re-uploaded under a new URL? Skip it unless we're deliberately re-using history
+        if content_hash in known_hashes:
+            rejection = "same content as a previous wallpaper"
+        else:
+            # Only the chosen candidate's real dimensions are checked (header read only)
+            rejection = check_downloaded_image(downloaded_file_path, is_suitable_resolution)
+        if rejection is None:
+            break
+        log.info(f"Skipping '{chosen_wallpaper['title']}': {rejection}. Trying another if available.")
+        os.remove(downloaded_file_path)
+        downloaded_file_path = None
+        content_hash = None
+    else:
+        log.error("All suitable wallpapers attempted and failed. Script cannot set a new wallpaper.")
+
+    # The other downloads are no longer needed: cancel queued ones and delete their files once finished
+    executor.shutdown(wait=False, cancel_futures=True)
+    for wallpaper, future in downloads:
+        if wallpaper is not chosen_wallpaper:
+            future.add_done_callback(discard_download)
+
+    return chosen_wallpaper, downloaded_file_path, content_hash
+
 # --- Functions for Setting Wallpaper and Cleanup ---
 
+def get_current_wallpaper():
+    # Path of the currently set desktop wallpaper, or None if it can't be determined
+    try:
+        import ctypes # For Windows API calls (SystemParametersInfoW)
+
+        buffer = ctypes.create_unicode_buffer(MAX_PATH)
+        if not ctypes.windll.user32.SystemParametersInfoW(SPI_GETDESKWALLPAPER, MAX_PATH, buffer, 0):
+            return None
+        return buffer.value or None
+    except Exception as e:
+        log.warning(f"Warning: Could not read the current wallpaper: {e}")
+        return None
+
 def set_windows_wallpaper(image_path, style_setting):
-    print(f"Setting wallpaper to: {image_path} with style: {style_setting}")
+    log.info(f"Setting wallpaper to: {image_path} with style: {style_setting}")
     
     try:
+        import ctypes # For Windows API calls (SystemParametersInfoW)
+        import winreg # For modifying Windows registry (wallpaper style)
+
         ctypes.windll.user32.SystemParametersInfoW(SPI_SETDESKWALLPAPER, 0, image_path, SPIF_UPDATEINIFILE | SPIF_SENDCHANGE)
 
-        key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Control Panel\Desktop", 0, winreg.KEY_WRITE)
-
-        wallpaper_style_value = "10" # Default to Fill
-        tile_wallpaper_value = "0"
-
-        if style_setting.lower() == 'fill':
-            wallpaper_style_value = "10"
-            tile_wallpaper_value = "0"
-        elif style_setting.lower() == 'fit':
-            wallpaper_style_value = "6"
-            tile_wallpaper_value = "0"
-        elif style_setting.lower() == 'stretch':
-            wallpaper_style_value = "2"
-            tile_wallpaper_value = "0"
-        elif style_setting.lower() == 'center':
-            wallpaper_style_value = "0"
-            tile_wallpaper_value = "0"
-        elif style_setting.lower() == 'tile':
-            wallpaper_style_value = "0"
-            tile_wallpaper_value = "1"
-        else:
-            print(f"Warning: Unknown wallpaper style '{style_setting}'. Defaulting to 'fill'.")
+        style_key = style_setting.lower()
+        if style_key not in WALLPAPER_STYLE_MAP:
+            log.warning(f"Warning: Unknown wallpaper style '{style_setting}'. Defaulting to 'fill'.")
+        wallpaper_style_value, tile_wallpaper_value = WALLPAPER_STYLE_MAP.get(style_key, WALLPAPER_STYLE_MAP['fill'])
 
-        winreg.SetValueEx(key, "WallpaperStyle", 0, winreg.REG_SZ, wallpaper_style_value)
-        winreg.SetValueEx(key, "TileWallpaper", 0, winreg.REG_SZ, tile_wallpaper_value)
-        winreg.CloseKey(key)
-        
-        print("Wallpaper set successfully.")
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Control Panel\Desktop", 0, winreg.KEY_WRITE) as key:
+            winreg.SetValueEx(key, "WallpaperStyle", 0, winreg.REG_SZ, wallpaper_style_value)
+            winreg.SetValueEx(key, "TileWallpaper", 0, winreg.REG_SZ, tile_wallpaper_value)
+
+        log.info("Wallpaper set successfully.")
         return True
     except Exception as e:
-        print(f"Error setting Windows wallpaper: {e}")
+        log.error(f"Error setting Windows wallpaper: {e}")
         return False
 
-def clean_up_old_wallpapers(download_dir, current_wallpaper_path):
-    print(f"\nCleaning up old wallpapers in: {download_dir}")
-    
-    patterns = ['*.jpg', '*.jpeg', '*.png', '*.gif']
-    files_to_check = []
-    for pattern in patterns:
-        files_to_check.extend(glob.glob(os.path.join(download_dir, pattern)))
+def clean_up_old_wallpapers(file_paths):
+    # Deletes the given wallpaper files; the history tracks which downloads are managed,
+    # so no directory scan is needed
+    log.info(f"\nCleaning up {len(file_paths)} old wallpaper files...")
 
     deleted_count = 0
-    for file_path in files_to_check:
-        if os.path.normcase(file_path) != os.path.normcase(current_wallpaper_path):
-            try:
-                os.remove(file_path)
-                print(f"  - Deleted: {os.path.basename(file_path)}")
-                deleted_count += 1
-            except Exception as e:
-                print(f"  - Error deleting {os.path.basename(file_path)}: {e}")
-    
-    print(f"Cleanup complete. Deleted {deleted_count} old wallpaper files.")
+    for file_path in file_paths:
+        try:
+            os.remove(file_path)
+            log.info(f"  - Deleted: {os.path.basename(file_path)}")
+            deleted_count += 1
+        except FileNotFoundError:
+            pass # Already gone (e.g. removed by hand)
+        except Exception as e:
+            log.error(f"  - Error deleting {os.path.basename(file_path)}: {e}")
+
+    log.info(f"Cleanup complete. Deleted {deleted_count} old wallpaper files.")
 
 # --- History functions ---
 MAX_HISTORY_SIZE = 10 # Global constant for history size
 
 def load_history():
+    # History is {'urls': [...], 'hashes': [...], 'files': [...]}, oldest first, where 'files' are
+    # {'url', 'path', 'hash'} entries for the downloaded wallpapers still on disk. Returns it together
+    # with sets of the URLs and content hashes for O(1) lookups.
+    data = []
     if os.path.exists(GLOBAL_HISTORY_PATH):
-        with open(GLOBAL_HISTORY_PATH, 'r') as f:
+        with open(GLOBAL_HISTORY_PATH, 'rb') as f:
             try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                print(f"Warning: Could not decode {GLOBAL_HISTORY_PATH}. Starting with empty history.")
-                return []
-    return []
+                data = json_loads(f.read())
+            except ValueError:
+                log.warning(f"Warning: Could not decode {GLOBAL_HISTORY_PATH}. Starting with empty history.")
+    if isinstance(data, list): # Older history files only stored a list of URLs
+        data = {'urls': data}
+    history = {key: list(data.get(key, [])) for key in ('urls', 'hashes', 'files')}
+    # Earlier history files stored bare paths; they can still be cleaned up but never re-used
+    history['files'] = [{'url': None, 'path': entry, 'hash': None} if isinstance(entry, str) else entry
+                        for entry in history['files']]
+    return history, set(history['urls']), set(history['hashes'])
+
+def add_to_history(entries, entry_set, entry):
+    # Appends entry as the most recent one, moving it there instead of duplicating it if already present
+    if entry in entry_set:
+        entries.remove(entry)
+    entries.append(entry)
+    entry_set.add(entry)
 
 def save_history(history):
-    history = history[-MAX_HISTORY_SIZE:] 
-    with open(GLOBAL_HISTORY_PATH, 'w') as f:
-        json.dump(history, f, indent=4)
+    history = {key: entries[-MAX_HISTORY_SIZE:] for key, entries in history.items()}
+    write_file_atomically(GLOBAL_HISTORY_PATH, json_dumps(history))
 
 # --- Interactive Setup Function ---
 def setup_initial_config():
@@ -364,6 +670,7 @@ def setup_initial_config():
     detected_res_str = ""
     detected_width, detected_height = 0, 0
     try:
+        from screeninfo import get_monitors
         monitors = get_monitors()
         if monitors:
             main_monitor = monitors[0]
@@ -421,7 +728,7 @@ def setup_initial_config():
             print("Invalid input. Please choose from 'daily', 'hourly', 'minutely', or 'seconds'.")
 
     # 4. Reddit Settings
-    subreddit_input = input("[4/7] Enter the subreddit to get wallpapers from (e.g., wallpapers, earthporn) [default: wallpapers]: ").strip()
+    subreddit_input = input("[4/7] Enter the subreddit(s) to get wallpapers from, comma-separated (e.g., wallpapers, earthporn) [default: wallpapers]: ").strip()
     temp_config['SETTINGS']['SUBREDDIT'] = subreddit_input if subreddit_input else 'wallpapers'
 
     while True:
@@ -526,8 +833,9 @@ def setup_initial_config():
             print("Invalid input. Please enter 'yes' or 'no'.")
 
     # Save Config
-    with open(GLOBAL_CONFIG_PATH, 'w') as configfile:
-        temp_config.write(configfile)
+    config_buffer = io.StringIO()
+    temp_config.write(config_buffer)
+    write_file_atomically(GLOBAL_CONFIG_PATH, config_buffer.getvalue(), mode='w')
     print(f"\nConfiguration saved to: {GLOBAL_CONFIG_PATH}")
 
     # Generate Task Scheduler Script
@@ -629,7 +937,9 @@ Write-Host "To view/modify this task, open Task Scheduler (taskschd.msc) and nav
 
 # --- Main execution block ---
 if __name__ == "__main__":
-    print("Starting wallpaper script...")
+    # Plain messages on stdout, so output looks the same as before and the scheduled task's log redirect captures it
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+    log.info("Starting wallpaper script...")
 
     # Check if config.ini exists. If not, run interactive setup.
     should_run_main_logic = True # Flag to control if main logic should execute
@@ -647,10 +957,7 @@ if __name__ == "__main__":
     if should_run_main_logic:
         # Now, load settings (config.ini should exist after setup_initial_config)
         settings, reddit_api_settings = load_config()
-
-        # Check internet connection
-        if not check_internet_connection():
-            sys.exit("Script terminated due to no internet connection.")
+        SESSION.headers["User-Agent"] = reddit_api_settings.get('USER_AGENT')
 
         # Get resolution details and preference
         detected_res, target_res, allow_variation = get_resolutions_and_preference(settings)
@@ -663,75 +970,100 @@ if __name__ == "__main__":
         else:
             download_path = configured_download_path
 
-        if not os.path.exists(download_path):
-            os.makedirs(download_path)
-            print(f"Created download directory: {download_path}")
-        else:
-            print(f"Using download directory: {download_path}")
+        # Single call, no exists()/makedirs() race
+        os.makedirs(download_path, exist_ok=True)
+        log.info(f"Using download directory: {download_path}")
 
-        # Fetch posts from Reddit
-        reddit_posts = get_reddit_posts(settings, reddit_api_settings)
+        # Fetch posts from Reddit (this also serves as the internet connection check)
+        try:
+            reddit_posts = get_reddit_posts(settings)
+        except requests.exceptions.ConnectionError as e:
+            log.error(f"Error: Could not establish network connection. Details: {e}")
+            sys.exit("Script terminated due to no internet connection.")
         if not reddit_posts:
             sys.exit("No posts fetched from Reddit. Script terminated.")
 
-        # Filter suitable wallpapers
-        suitable_wallpapers = filter_wallpapers(reddit_posts, target_res, allow_variation, settings)
+        # --- Load History (used to skip already-seen wallpapers during filtering) ---
+        current_history, history_set, hash_set = load_history()
+        log.info(f"Loaded wallpaper history ({len(current_history['urls'])} items).")
+
+        # Filter suitable wallpapers, excluding ones already in history
+        suitable_wallpapers = filter_wallpapers(reddit_posts, target_res, allow_variation, settings, history_set)
+
+        reusing_history = False
+        if not suitable_wallpapers and history_set:
+            log.info("No new unique wallpapers found. Re-using from historical list to ensure a wallpaper change attempt.")
+            suitable_wallpapers = filter_wallpapers(reddit_posts, target_res, allow_variation, settings)
+            reusing_history = True
 
         if not suitable_wallpapers:
             sys.exit("No suitable wallpapers found after filtering. Script terminated.")
-        
-        # --- Load History and Filter for Uniqueness ---
-        current_history = load_history()
-        print(f"Loaded wallpaper history ({len(current_history)} items).")
-
-        available_wallpapers_to_try = [w for w in suitable_wallpapers if w['url'] not in current_history]
-        
-        if not available_wallpapers_to_try:
-            print("No new unique wallpapers found. Re-using from historical list to ensure a wallpaper change attempt.")
-            available_wallpapers_to_try = list(suitable_wallpapers)
 
+        is_suitable_resolution = resolution_filter(target_res, allow_variation)
         downloaded_file_path = None
-        chosen_wallpaper = None
-
-        # --- Loop to select and download until successful or options exhausted ---
-        while available_wallpapers_to_try:
-            reddit_hosted_options = [w for w in available_wallpapers_to_try if w['is_reddit_host']]
-            imgur_hosted_options = [w for w in available_wallpapers_to_try if not w['is_reddit_host']]
-
-            if reddit_hosted_options:
-                chosen_wallpaper = random.choice(reddit_hosted_options)
-                print(f"\nAttempting to download prioritized i.redd.it wallpaper: '{chosen_wallpaper['title']}'")
-            elif imgur_hosted_options:
-                chosen_wallpaper = random.choice(imgur_hosted_options)
-                print(f"\nNo i.redd.it wallpaper available, attempting Imgur wallpaper: '{chosen_wallpaper['title']}'")
+        reused_local_file = False
+
+        if reusing_history:
+            # Zero-network fast path: re-use a history wallpaper whose file is still on disk
+            local_files = {entry['url']: entry for entry in current_history['files']}
+            reusable_wallpapers = [w for w in suitable_wallpapers
+                                   if w['url'] in local_files and os.path.isfile(local_files[w['url']]['path'])]
+            # The newest managed file is usually the current wallpaper; picking it would change nothing
+            current_wallpaper = get_current_wallpaper()
+            if current_wallpaper:
+                current_file = os.path.normcase(os.path.abspath(current_wallpaper))
+            elif current_history['files']:
+                current_file = os.path.normcase(current_history['files'][-1]['path'])
             else:
-                print("\nNo more unique wallpapers left to try. All options exhausted.")
-                break
-
-            downloaded_file_path = download_wallpaper(chosen_wallpaper, download_path)
+                current_file = None
+            other_wallpapers = [w for w in reusable_wallpapers
+                                if os.path.normcase(local_files[w['url']]['path']) != current_file]
+            if other_wallpapers:
+                reusable_wallpapers = other_wallpapers
+            if reusable_wallpapers:
+                chosen_wallpaper = _RNG.choice(reusable_wallpapers)
+                local_file = local_files[chosen_wallpaper['url']]
+                downloaded_file_path, content_hash = local_file['path'], local_file['hash']
+                reused_local_file = True
+                log.info(f"\nRe-using previously downloaded wallpaper: '{chosen_wallpaper['title']}'")
 
-            if downloaded_file_path:
-                break
-            else:
-                print(f"Failed to download '{chosen_wallpaper['title']}'. Removing from current options and trying another if available.")
-                available_wallpapers_to_try.remove(chosen_wallpaper)
-
-                if not available_wallpapers_to_try:
-                    print("All suitable wallpapers attempted and failed. Script cannot set a new wallpaper.")
-                    break
+        if not downloaded_file_path:
+            # Known content hashes are only rejected when we're looking for a new wallpaper
+            known_hashes = frozenset() if reusing_history else hash_set
+            chosen_wallpaper, downloaded_file_path, content_hash = download_wallpaper_candidates(
+                suitable_wallpapers, download_path, is_suitable_resolution, known_hashes)
 
         if not downloaded_file_path:
             sys.exit("Script terminated: Failed to download any suitable wallpaper after multiple attempts.")
 
         # --- Set the downloaded image as Windows wallpaper ---
         wallpaper_style = settings.get('WALLPAPER_STYLE', 'fill')
-        if not set_windows_wallpaper(downloaded_file_path, wallpaper_style):
-            print("Could not set wallpaper. Manual intervention may be needed.")
+        current_wallpaper = get_current_wallpaper()
+        if current_wallpaper and os.path.normcase(current_wallpaper) == os.path.normcase(os.path.abspath(downloaded_file_path)):
+            # Avoid a full desktop refresh + broadcast when nothing would change
+            log.info(f"{downloaded_file_path} is already the current wallpaper. Skipping the wallpaper update.")
+            wallpaper_set = True
+        else:
+            wallpaper_set = set_windows_wallpaper(downloaded_file_path, wallpaper_style)
+
+        if not wallpaper_set:
+            log.error("Could not set wallpaper. Manual intervention may be needed.")
+            files_to_delete = [] if reused_local_file else [downloaded_file_path]
         else:
-            current_history.append(chosen_wallpaper['url'])
+            add_to_history(current_history['urls'], history_set, chosen_wallpaper['url'])
+            add_to_history(current_history['hashes'], hash_set, content_hash)
+            # Managed files map history URLs to their file on disk; a re-used file moves to the end
+            file_path = os.path.abspath(downloaded_file_path)
+            managed_files = [entry for entry in current_history['files'] if entry['path'] != file_path]
+            managed_files.append({'url': chosen_wallpaper['url'], 'path': file_path, 'hash': content_hash})
+            # Files that fall out of the history window are the ones to delete
+            files_to_delete = [entry['path'] for entry in managed_files[:-MAX_HISTORY_SIZE]]
+            current_history['files'] = managed_files[-MAX_HISTORY_SIZE:]
             save_history(current_history)
 
-        # --- Clean up old wallpapers ---
-        clean_up_old_wallpapers(download_path, downloaded_file_path)
+        # --- Clean up old wallpapers (in the background, off the critical path) ---
+        cleanup_thread = threading.Thread(target=clean_up_old_wallpapers, args=(files_to_delete,))
+        cleanup_thread.start()
 
-        print("\nScript finished successfully!")
+        log.info("\nScript finished successfully!")
+        cleanup_thread.join()